@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+import re
+import sys
+import json
+import numpy as np
+import networkx as nx
+from snapshot import load_snapshot
+
+SUBREDDIT_RE = re.compile(r'/r/([^/]+)/')
+
+def graph_arrays(graph):
+    """Flattens a user graph from same_submission.py into numpy arrays.
+
+    A user of several subreddits ("user_of" of "A,B") is split evenly
+    across them rather than treated as a group "A,B" of their own: their
+    row of 'membership' has 1/2 under A and 1/2 under B. Every edge then
+    spreads one unit of weight over the groups of its endpoints, so group
+    pair counts, the E-I index and assortativity all count each edge once
+    and only ever mention real subreddits. Users with no user_of have an
+    all-zero row and drop out of those measures.
+
+    Returns:
+        a dict with 'nodes' and 'labels' (user_of of each node, one entry
+        per node), 'groups' (the distinct subreddits), 'membership'
+        (nodes x groups weights, rows summing to 1), 'u' and 'v' (node
+        indices per edge), 'in_group' and 'out_group' (booleans per edge)
+        and 'out_group_submissions' (the raw edge strings, '' if absent)
+    """
+    nodes = list(graph.nodes())
+    node_index = dict((node, i) for i, node in enumerate(nodes))
+    labels = np.array([graph.node[node].get('user_of', '') for node in nodes],
+                      dtype=object)
+    split = [[g for g in str(label).split(',') if g] for label in labels]
+    groups = np.array(sorted(set(g for node_groups in split
+                                 for g in node_groups)), dtype=str)
+    group_index = dict((g, k) for k, g in enumerate(groups))
+    rows, cols, weights = [], [], []
+    for i, node_groups in enumerate(split):
+        for g in node_groups:
+            rows.append(i)
+            cols.append(group_index[g])
+            weights.append(1.0 / len(node_groups))
+    membership = np.zeros((len(nodes), len(groups)))
+    membership[rows, cols] = weights
+
+    u, v, in_group, out_group = [], [], [], []
+    out_group_submissions = []
+    for a, b, eattr in graph.edges(data=True):
+        u.append(node_index[a])
+        v.append(node_index[b])
+        in_group.append(bool(eattr.get('in_group_submissions')))
+        out_group.append(bool(eattr.get('out_group_submissions')))
+        out_group_submissions.append(eattr.get('out_group_submissions', ''))
+
+    return {'nodes': nodes,
+            'labels': labels,
+            'groups': groups,
+            'membership': membership,
+            'u': np.array(u, dtype=np.intp),
+            'v': np.array(v, dtype=np.intp),
+            'in_group': np.array(in_group, dtype=bool),
+            'out_group': np.array(out_group, dtype=bool),
+            'out_group_submissions': out_group_submissions}
+
+def mixing_matrix(arrays, mask=None):
+    """Groups x groups edge weight, symmetric, each edge counted once.
+
+    Entry [g, h] + [h, g] (or [g, g]) is the weight of edges between g and
+    h; mask selects a subset of the edges.
+    """
+    mu = arrays['membership'][arrays['u']]
+    mv = arrays['membership'][arrays['v']]
+    if mask is not None:
+        mu, mv = mu[mask], mv[mask]
+    return (np.dot(mu.T, mv) + np.dot(mv.T, mu)) / 2.0
+
+def group_pair_edge_counts(arrays):
+    """Counts in_group and out_group edges per unordered pair of groups.
+
+    Counts are fractional where an endpoint is a user of several groups.
+    """
+    groups = arrays['groups']
+    in_mixing = mixing_matrix(arrays, arrays['in_group'])
+    out_mixing = mixing_matrix(arrays, arrays['out_group'])
+    # fold the symmetric halves onto the upper triangle
+    in_counts = np.triu(in_mixing + in_mixing.T) - np.diag(np.diag(in_mixing))
+    out_counts = (np.triu(out_mixing + out_mixing.T) -
+                  np.diag(np.diag(out_mixing)))
+    pairs = []
+    for g, h in zip(*np.nonzero(in_counts + out_counts)):
+        pairs.append({'groups': [str(groups[g]), str(groups[h])],
+                      'in_group_edges': float(in_counts[g, h]),
+                      'out_group_edges': float(out_counts[g, h])})
+    return pairs
+
+def multi_group_users(arrays):
+    """Users whose user_of lists more than one subreddit."""
+    multi = np.flatnonzero((arrays['membership'] > 0).sum(axis=1) > 1)
+    return [{'user': str(arrays['nodes'][i]),
+             'user_of': str(arrays['labels'][i]).split(',')} for i in multi]
+
+def ei_index(arrays):
+    """Krackhardt's E-I index, (E - I) / (E + I), overall and per group.
+
+    Edge weight between different groups is external (E), within a group
+    internal (I); see graph_arrays for how multi-group users are split.
+    Returns None where a group has no edges.
+    """
+    mixing = mixing_matrix(arrays)
+    internal = np.diag(mixing)
+    external_by_group = mixing.sum(axis=1) * 2 - internal * 2
+
+    def index(e, i):
+        return None if e + i == 0 else float(e - i) / (e + i)
+
+    total = float(mixing.sum())
+    return {'overall': index(total - float(internal.sum()),
+                             float(internal.sum())),
+            'by_group': dict((str(g), index(float(external_by_group[k]),
+                                            float(internal[k])))
+                             for k, g in enumerate(arrays['groups']))}
+
+def user_of_assortativity(arrays):
+    """Newman's attribute assortativity of the graph by user_of."""
+    mixing = mixing_matrix(arrays)
+    if mixing.sum() == 0:
+        return None
+    mixing = mixing / mixing.sum()
+    a = mixing.sum(axis=1)
+    expected = float(np.dot(a, a))
+    if expected == 1.0:
+        return None
+    return (float(np.trace(mixing)) - expected) / (1.0 - expected)
+
+def cross_group_edges(arrays):
+    """Booleans per edge: True where the endpoints share no user_of group.
+
+    Edges to a user with no user_of are never cross-group.
+    """
+    mu = arrays['membership'][arrays['u']] > 0
+    mv = arrays['membership'][arrays['v']] > 0
+    return mu.any(axis=1) & mv.any(axis=1) & ~(mu & mv).any(axis=1)
+
+def out_group_venues(arrays, mask=None):
+    """Ranks subreddits where out_group_submissions edges were found.
+
+    mask selects a subset of the edges, e.g. cross_group_edges(arrays).
+    """
+    venues, permalinks = [], []
+    for k, submissions in enumerate(arrays['out_group_submissions']):
+        if not submissions or (mask is not None and not mask[k]):
+            continue
+        for permalink in submissions.split(','):
+            match = SUBREDDIT_RE.search(permalink)
+            if match:
+                venues.append(match.group(1))
+                permalinks.append(permalink)
+    if not venues:
+        return []
+    venues = np.array(venues)
+    names, edge_counts = np.unique(venues, return_counts=True)
+    unique_pairs = np.unique(np.array(list(zip(venues, permalinks))), axis=0)
+    submission_counts = dict(zip(*np.unique(unique_pairs[:, 0],
+                                            return_counts=True)))
+    order = np.lexsort((names, -edge_counts))
+    return [{'subreddit': str(names[k]),
+             'edges': int(edge_counts[k]),
+             'submissions': int(submission_counts[names[k]])}
+            for k in order]
+
+def graph_report(graph):
+    """Computes the cross-group report for a same_submission.py graph.
+
+    Arguments:
+        graph: a NetworkX Graph object whose nodes have "user_of" and whose
+               edges have "in_group_submissions"/"out_group_submissions"
+
+    Returns:
+        a dict, suitable for json.dump; "out_group_venues" counts only
+        edges between users of different subreddits (as in
+        true_out_group_submissions.tsv), "out_group_venues_all_edges"
+        counts every edge
+    """
+    arrays = graph_arrays(graph)
+    return {'nodes': len(arrays['nodes']),
+            'edges': len(arrays['u']),
+            'groups': [str(g) for g in arrays['groups']],
+            'multi_group_users': multi_group_users(arrays),
+            'group_pair_edges': group_pair_edge_counts(arrays),
+            'ei_index': ei_index(arrays),
+            'user_of_assortativity': user_of_assortativity(arrays),
+            'out_group_venues': out_group_venues(arrays,
+                                                 cross_group_edges(arrays)),
+            'out_group_venues_all_edges': out_group_venues(arrays)}
+
+def write_report(report, f=sys.stdout):
+    json.dump(report, f, indent=2, sort_keys=True)
+    f.write("\n")
+
+def main():
+    if len(sys.argv) != 2:
+        sys.stderr.write("usage: analytics.py <graph.gexf|graph.rsnap>\n")
+        sys.stderr.write("(writes a JSON report to stdout)\n")
+        sys.exit()
+
+    filename = sys.argv[1]
+    if filename.endswith(".rsnap"):
+        with load_snapshot(filename) as snapshot:
+            graph = snapshot.to_networkx()
+    else:
+        graph = nx.read_gexf(filename)
+    write_report(graph_report(graph))
+
+############################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""Resident crawler that keeps one praw session and its caches warm.
+
+Jobs are JSON files dropped into <queue>/pending/ (use "submit" below).
+A worker claims a job by renaming it into running/, tagged with the
+host and pid of its daemon, writes its graph or report into output/ and
+moves the job to done/ or failed/ with a "result" or "error" field
+added. Several daemons may serve one queue; on startup a daemon puts
+back into pending/ only the running jobs of dead daemons on its own host. All jobs share one praw.Reddit handle
+and the caches in WarmReddit, so a redditor, subreddit listing or
+comment tree fetched for one job is not fetched again for the next
+until it expires or is evicted (see WarmCache).
+
+Job fields:
+    type:       "pair" (same_submission.py), "single" (graph_one_subreddit.py
+                or graph_two_subreddits.py) or "overlap" (user overlap of
+                two subreddits, as in compare_subreddits.py)
+    subreddits: a list of subreddit names (two for "pair" and "overlap")
+    limit:      fetch limit, null for as many as possible
+    min_weight, top_neighbors, k_core: see reduce_graph.py
+    top_k, pair_capacity: "single" only, see sketches.py
+    format:     "gexf" or "snap"
+"""
+
+import os
+import sys
+import json
+import socket
+import time
+import uuid
+import datetime
+import threading
+import collections
+import praw
+import networkx as nx
+import same_submission
+import graph_two_subreddits
+from reduce_graph import reduce_graph
+
+QUEUE_DIRS = ('pending', 'running', 'done', 'failed', 'output')
+
+def listing_cost(value):
+    """Cache cost of a value: the number of items in it, at least 1."""
+    try:
+        return max(len(value), 1)
+    except TypeError:
+        return 1
+
+class WarmCache(object):
+    """Thread-safe LRU cache that fetches each missing key only once.
+
+    If a second thread asks for a key that is being fetched, it waits for
+    the first fetch instead of repeating it. Entries expire ttl seconds
+    after they were fetched, so a long-running daemon does not serve stale
+    user histories. The cache holds at most max_cost items in total: each
+    entry costs its number of listed things (submissions, comments,
+    redditors) and comment trees are charged to the entry that holds
+    their submission once they are loaded.
+    """
+
+    def __init__(self, max_cost=500000, ttl=3600):
+        self.max_cost = max_cost
+        self.ttl = ttl
+        self.entries = collections.OrderedDict() # key -> [value, cost, expires]
+        self.total_cost = 0
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+    def _evict(self):
+        # caller holds self.lock
+        while self.total_cost > self.max_cost and self.entries:
+            key, (value, cost, expires) = self.entries.popitem(last=False)
+            self.total_cost -= cost
+
+    def get(self, key, fetch, cost=listing_cost):
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry[2] < time.time():
+                    del self.entries[key]
+                    self.total_cost -= entry[1]
+                    entry = None
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                event = self.in_flight.get(key)
+                if event is None:
+                    event = self.in_flight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()
+        try:
+            value = fetch()
+            value_cost = cost(value)
+            with self.lock:
+                self.entries[key] = [value, value_cost, time.time() + self.ttl]
+                self.total_cost += value_cost
+                self._evict()
+            return value
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            event.set()
+
+    def charge(self, key, extra):
+        """Adds extra to the cost of key's entry, if it is still cached."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry[1] += extra
+                self.total_cost += extra
+                self._evict()
+
+class CachedSubmission(object):
+    """A praw Submission shared between jobs.
+
+    replace_more_comments runs once per submission however many jobs ask
+    for it, and the loaded comment tree is charged to owner_key, the cache
+    entry that keeps this submission alive.
+    """
+
+    def __init__(self, submission, cache, owner_key):
+        self._submission = submission
+        self._cache = cache
+        self._owner_key = owner_key
+        self._lock = threading.Lock()
+        self._replaced = False
+
+    def __getattr__(self, name):
+        return getattr(self._submission, name)
+
+    def __str__(self):
+        return str(self._submission)
+
+    def __eq__(self, other):
+        return self.fullname == getattr(other, 'fullname', None)
+
+    def __hash__(self):
+        return hash(self.fullname)
+
+    def replace_more_comments(self, *args, **kwargs):
+        with self._lock:
+            if self._replaced:
+                return []
+            skipped = self._submission.replace_more_comments(*args, **kwargs)
+            self._replaced = True
+            self._cache.charge(self._owner_key, len(
+                    praw.helpers.flatten_tree(self._submission.comments)))
+            return skipped
+
+class CachedComment(object):
+    """A praw Comment whose containing submission is shared between jobs."""
+
+    def __init__(self, comment, cache):
+        self._comment = comment
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._comment, name)
+
+    def __str__(self):
+        return str(self._comment)
+
+    @property
+    def submission(self):
+        key = ('submission', self._comment.link_id)
+        # get_submission fetches the comment tree too, so charge for it
+        return self._cache.get(key,
+                lambda: CachedSubmission(self._comment.submission,
+                                         self._cache, key),
+                cost=lambda s: 1 + len(praw.helpers.flatten_tree(s.comments)))
+
+class CachedRedditor(object):
+    """A praw Redditor whose submission and comment listings are cached."""
+
+    def __init__(self, redditor, cache):
+        self._redditor = redditor
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._redditor, name)
+
+    def __str__(self):
+        return str(self._redditor)
+
+    def get_submitted(self, limit=None):
+        key = ('submitted', self._redditor.name, limit)
+        return iter(self._cache.get(key,
+                lambda: [CachedSubmission(s, self._cache, key) for s in
+                         self._redditor.get_submitted(limit=limit)]))
+
+    def get_comments(self, limit=None):
+        return iter(self._cache.get(
+                ('comments', self._redditor.name, limit),
+                lambda: [CachedComment(c, self._cache) for c in
+                         self._redditor.get_comments(limit=limit)]))
+
+class CachedSubreddit(object):
+    """A praw Subreddit whose top-of-month listing is cached."""
+
+    def __init__(self, subreddit, cache):
+        self._subreddit = subreddit
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._subreddit, name)
+
+    def __str__(self):
+        return str(self._subreddit)
+
+    def get_top_from_month(self, limit=None):
+        key = ('top_from_month', self._subreddit.display_name.lower(), limit)
+        return iter(self._cache.get(key,
+                lambda: [CachedSubmission(s, self._cache, key) for s in
+                         self._subreddit.get_top_from_month(limit=limit)]))
+
+class WarmReddit(object):
+    """Wraps a praw.Reddit handle, caching what jobs fetch.
+
+    Redditors and their histories, subreddit top listings and the
+    submissions (with comment trees) they lead to are shared by all jobs.
+    Anything not overridden here is passed through to praw unchanged, so
+    the functions in same_submission.py can be given a WarmReddit as r.
+    """
+
+    def __init__(self, r, cache):
+        self._r = r
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._r, name)
+
+    def get_redditor(self, username):
+        redditor = self.cache.get(('redditor', username),
+                                  lambda: self._r.get_redditor(username))
+        return CachedRedditor(redditor, self.cache)
+
+    def get_subreddit(self, name):
+        return CachedSubreddit(self._r.get_subreddit(name), self.cache)
+
+    def wrap_redditor(self, redditor):
+        return CachedRedditor(redditor, self.cache)
+
+    def get_subreddit_authors(self, sub, limit):
+        return self.cache.get(('authors', sub.lower(), limit),
+                lambda: graph_two_subreddits.get_all_redditors_from_a_sub(
+                        self._r, sub, limit))
+
+    def get_subreddits_visited(self, redditor, limit):
+        return self.cache.get(('visited', redditor.name, limit),
+                lambda: graph_two_subreddits.get_subreddits_visited_for_redditor(
+                        self.wrap_redditor(redditor), limit))
+
+def write_job_graph(graph, job, queue_dir, name):
+    filename = os.path.join(queue_dir, 'output', name + "." +
+                            datetime.datetime.now().isoformat())
+    same_submission.write_graph(graph, filename, job.get('format', "gexf"))
+    return filename + (".rsnap" if job.get('format') == "snap" else ".gexf")
+
+def run_pair_job(job, r, queue_dir, VERBOSE=False):
+    """Same steps as same_submission.main, against the shared handle."""
+    # imported here so numpy is only needed by daemons that run pair jobs
+    from analytics import graph_report
+    sub1, sub2 = job['subreddits']
+    limit = job.get('limit', 1)
+    graph = nx.Graph()
+    reply_graph = nx.DiGraph()
+    for sub in (sub1, sub2):
+        graph = same_submission.update_graph_with_subreddit_of_interest(
+                graph, limit, sub, r, False, VERBOSE, reply_graph)
+    for user in graph.nodes():
+        same_submission.update_graph_with_user_comments(
+                graph, user, r, (sub1, sub2), False, VERBOSE, limit)
+    graph, reduction = reduce_graph(graph, job.get('min_weight'),
+            job.get('top_neighbors'), job.get('k_core'), VERBOSE)
+
+    name = sub1 + "." + sub2 + ".limit_" + str(limit)
+    return {'graph': write_job_graph(graph, job, queue_dir, name),
+            'replies': write_job_graph(reply_graph, job, queue_dir,
+                                       sub1 + "." + sub2 + ".replies.limit_" +
+                                       str(limit)),
+            'reduction': reduction,
+            'report': graph_report(graph)}
+
+def run_single_job(job, r, queue_dir, VERBOSE=False):
+    """Same steps as graph_one_subreddit.main / graph_two_subreddits.main."""
+    subs = job['subreddits']
+    limit = job.get('limit')
+    all_redditors = []
+    for sub in subs:
+        # deleted comments have no author
+        all_redditors += [u for u in r.get_subreddit_authors(sub, limit)
+                          if u is not None]
+
+    graph = graph_two_subreddits.build_subreddit_graph(all_redditors, limit,
+            job.get('top_k'), job.get('pair_capacity'),
+            r.get_subreddits_visited, VERBOSE)
+    graph, reduction = reduce_graph(graph, job.get('min_weight'),
+            job.get('top_neighbors'), job.get('k_core'), VERBOSE)
+
+    name = ".".join(subs) + ".linked_by_common_users.limit_" + str(limit)
+    return {'graph': write_job_graph(graph, job, queue_dir, name),
+            'redditors': len(all_redditors),
+            'reduction': reduction}
+
+def run_overlap_job(job, r, queue_dir, VERBOSE=False):
+    """User overlap of two subreddits, as printed by compare_subreddits.py."""
+    sub1, sub2 = job['subreddits']
+    limit = job.get('limit')
+    # deleted comments have no author; str(None) would count as a user
+    group1 = set(str(u) for u in r.get_subreddit_authors(sub1, limit)
+                 if u is not None)
+    group2 = set(str(u) for u in r.get_subreddit_authors(sub2, limit)
+                 if u is not None)
+    common_users = group1 & group2
+    denominator = min(len(group1), len(group2))
+    return {'users': {sub1: len(group1), sub2: len(group2)},
+            'common_users': sorted(common_users),
+            'O_r': (float(len(common_users)) / denominator
+                    if denominator else None)}
+
+JOB_TYPES = {'pair': run_pair_job,
+             'single': run_single_job,
+             'overlap': run_overlap_job}
+
+def running_name(name):
+    """Name in running/ of job file name, claimed by this daemon."""
+    return "~".join((name, socket.gethostname(), str(os.getpid())))
+
+def job_name(path):
+    """The job's own file name, without any running/ owner tag."""
+    return os.path.basename(path).split("~", 1)[0]
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass # alive, but owned by another user
+    return True
+
+def requeue_orphaned_jobs(queue_dir):
+    """Moves jobs of dead daemons on this host from running/ to pending/.
+
+    Jobs claimed on other hosts are left alone, since we cannot tell if
+    their daemon is still running.
+    """
+    running = os.path.join(queue_dir, 'running')
+    for name in os.listdir(running):
+        try:
+            job, host, pid = name.rsplit("~", 2)
+            pid = int(pid)
+        except ValueError:
+            continue
+        if host != socket.gethostname() or pid_alive(pid):
+            continue
+        try:
+            os.rename(os.path.join(running, name),
+                      os.path.join(queue_dir, 'pending', job))
+        except OSError:
+            continue # another daemon requeued it first
+
+def claim_job(queue_dir):
+    """Moves the oldest pending job into running/; returns its path or None."""
+    pending = os.path.join(queue_dir, 'pending')
+    for name in sorted(os.listdir(pending)):
+        if not name.endswith(".json"):
+            continue
+        running = os.path.join(queue_dir, 'running', running_name(name))
+        try:
+            os.rename(os.path.join(pending, name), running)
+        except OSError:
+            continue # another worker got it first
+        return running
+    return None
+
+def run_job(path, r, queue_dir, VERBOSE=False):
+    """Runs one claimed job and moves it to done/ or failed/.
+    * A job file that cannot be read or parsed is moved to failed/ with
+      its raw text kept under "raw".
+    """
+    started = time.time()
+    job = {}
+    try:
+        with open(path) as f:
+            raw = f.read()
+        job = {'raw': raw}
+        job = json.loads(raw)
+        if not isinstance(job, dict):
+            job = {'raw': raw}
+            raise ValueError("job file is not a JSON object")
+        job['result'] = JOB_TYPES[job['type']](job, r, queue_dir, VERBOSE)
+        status = 'done'
+    except Exception as e:
+        sys.stderr.write("job " + job_name(path) +
+                         " failed: " + str(e) + "\n")
+        job['error'] = str(e)
+        status = 'failed'
+    job['seconds'] = time.time() - started
+    job['cache'] = {'hits': r.cache.hits, 'misses': r.cache.misses,
+                    'items': r.cache.total_cost}
+    finished = os.path.join(queue_dir, status, job_name(path))
+    with open(finished + ".tmp", 'w') as f:
+        json.dump(job, f, indent=2, sort_keys=True)
+    os.rename(finished + ".tmp", finished)
+    os.remove(path)
+    if VERBOSE:
+        print(status + ": " + job_name(path) + " in " +
+              str(round(job['seconds'], 1)) + "s")
+
+def worker(r, queue_dir, poll_seconds, VERBOSE=False):
+    while True:
+        path = claim_job(queue_dir)
+        if path is None:
+            time.sleep(poll_seconds)
+            continue
+        try:
+            run_job(path, r, queue_dir, VERBOSE)
+        except Exception as e:
+            # e.g. the queue directory became unwritable; keep the worker
+            sys.stderr.write("worker: could not finish job " + path +
+                             ": " + str(e) + "\n")
+            time.sleep(poll_seconds)
+
+def serve(queue_dir, workers=2, poll_seconds=1.0, max_cost=500000, ttl=3600,
+          VERBOSE=False):
+    for name in QUEUE_DIRS:
+        os.makedirs(os.path.join(queue_dir, name), exist_ok=True)
+    requeue_orphaned_jobs(queue_dir)
+
+    user_agent = ("reddit_sna crawl daemon v0.1 by /u/sna_bot "
+                  "https://github.com/brianreallymany/reddit_sna")
+    r = WarmReddit(praw.Reddit(user_agent=user_agent),
+                   WarmCache(max_cost, ttl))
+
+    threads = [threading.Thread(target=worker,
+                                args=(r, queue_dir, poll_seconds, VERBOSE))
+               for _ in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    if VERBOSE:
+        print("serving " + queue_dir + " with " + str(workers) + " workers")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+
+def submit(queue_dir, job):
+    """Atomically adds a job to the queue; returns its filename."""
+    os.makedirs(os.path.join(queue_dir, 'pending'), exist_ok=True)
+    name = (datetime.datetime.now().strftime("%Y%m%dT%H%M%S.%f") + "-" +
+            uuid.uuid4().hex[:8] + ".json")
+    path = os.path.join(queue_dir, 'pending', name)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(job, f, indent=2, sort_keys=True)
+    os.rename(path + ".tmp", path)
+    return path
+
+def usage():
+    sys.stderr.write("usage: crawl_daemon.py serve <queue_dir> "
+                     "[-w workers] [-p poll_seconds]\n"
+                     "           [-m max_cached_items] [-t cache_ttl_seconds] "
+                     "[-v]\n")
+    sys.stderr.write("       crawl_daemon.py submit <queue_dir> "
+                     "pair|single|overlap <subreddit> [<subreddit>]\n"
+                     "           [-l limit] [-k top_k] [-p pair_capacity] [-w min_weight] "
+                     "[-t top_neighbors] [-c k_core] [-f gexf|snap]\n")
+    sys.exit()
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] not in ('serve', 'submit'):
+        usage()
+
+    command, queue_dir = sys.argv[1], sys.argv[2]
+    if command == 'serve':
+        workers, poll_seconds, VERBOSE = 2, 1.0, False
+        max_cost, ttl = 500000, 3600
+        args = iter(sys.argv[3:])
+        for arg in args:
+            if arg == "-w":
+                workers = int(next(args))
+            elif arg == "-p":
+                poll_seconds = float(next(args))
+            elif arg == "-m":
+                max_cost = int(next(args))
+            elif arg == "-t":
+                ttl = float(next(args))
+            elif arg == "-v":
+                VERBOSE = True
+        serve(queue_dir, workers, poll_seconds, max_cost, ttl, VERBOSE)
+        return
+
+    if len(sys.argv) < 5 or sys.argv[3] not in JOB_TYPES:
+        usage()
+    job = {'type': sys.argv[3], 'subreddits': []}
+    int_options = {'-k': 'top_k', '-p': 'pair_capacity', '-w': 'min_weight',
+                   '-t': 'top_neighbors', '-c': 'k_core'}
+    args = iter(sys.argv[4:])
+    for arg in args:
+        if arg == "-l":
+            limit_string = next(args)
+            job['limit'] = None if limit_string == "None" else int(limit_string)
+        elif arg in int_options:
+            job[int_options[arg]] = int(next(args))
+        elif arg == "-f":
+            job['format'] = next(args)
+        else:
+            job['subreddits'].append(arg)
+    print(submit(queue_dir, job))
+
+############################################################################
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,9 @@ import sys
 import praw
 import networkx
 import datetime
+from sketches import CoVisitationSketch
+from reduce_graph import reduce_graph
+from snapshot import write_snapshot
 
 def get_all_redditors_from_a_sub(praw_handle, sub, num_comments):
     """Return a list of users who submitted the last num_comments comments to sub"""
@@ -45,12 +48,77 @@ def get_subreddits_visited_for_redditor(redditor, limit):
             continue
     return all_subreddits
 
+def build_subreddit_graph(all_redditors, limit, top_k=None, pair_capacity=None,
+        get_subreddits_visited=get_subreddits_visited_for_redditor,
+        VERBOSE=True):
+    """Builds the subreddit co-visitation graph for a list of redditors.
+    * Each subreddit a redditor visited is a node; its "users" property
+      counts redditors who visited it.
+    * Edges between subreddits visited by the same redditor are created
+      with weight=1, or have their weight incremented.
+    * If top_k is given, counts are streamed through a CoVisitationSketch
+      instead and only edges with weight > 1 are materialized.
+
+    Arguments:
+        all_redditors: a list of praw Redditor objects
+        limit: an integer passed to get_subreddits_visited, or None
+        top_k: an integer, or None
+        pair_capacity: an integer, or None (see sketches.py)
+        get_subreddits_visited: a function (redditor, limit) -> list of
+                                subreddit names
+        VERBOSE: a boolean
+
+    Returns:
+        a NetworkX Graph object
+    """
+    # Add nodes to graph for each subreddit, and add edges between
+    # subreddits when a single user users them
+    graph = networkx.Graph()
+    sketch = None
+    if top_k is not None:
+        # only heavy hitters are kept; the graph is built at the end
+        sketch = CoVisitationSketch(top_k, pair_capacity)
+    for redditor in all_redditors:
+        if VERBOSE:
+            print("working on " + str(redditor))
+        subs_visited = get_subreddits_visited(redditor, limit)
+        if VERBOSE:
+            print("\tvisited: " + str(subs_visited))
+        if sketch is not None:
+            sketch.add_subs_visited(subs_visited)
+            continue
+        for sub in subs_visited:
+            if sub not in graph.nodes():
+                graph.add_node(sub, users=1)
+            else:
+                graph.node[sub]['users'] += 1 # TODO verify this works
+        # ok if got 'pics', 'funny', 'gifs' need edges from pics to funny
+        # (create with weight=1 if not there, weight += 1 if already there)
+        # from pics to gifs and from funny to gifs
+        for i in range(len(subs_visited)):
+            this_sub = subs_visited[i]
+            for target in subs_visited[i+1:]:
+                if target not in graph[this_sub]:
+                    graph.add_edge(this_sub, target, weight=1)
+                else:
+                    graph[this_sub][target]['weight'] += 1
+
+    if sketch is not None:
+        sketch.print_bounds()
+        graph = sketch.to_graph(min_weight=2)
+    return graph
+
 def main():
     ## PARSE COMMAND LINE ARGS ##
     if len(sys.argv) < 3:
-        sys.stderr.write("usage: compare_subreddits.py <subreddit_1> <subreddit_2> [-d] [-v] [-l limit]\n")
+        sys.stderr.write("usage: compare_subreddits.py <subreddit_1> <subreddit_2> [-d] [-v] [-l limit] [-k top_k [-p pair_capacity]]\n"
+                         "       [-w min_weight] [-t top_neighbors] [-c k_core] [-f gexf|snap]\n")
         sys.stderr.write("-d is for debug mode, -v for verbose mode, limit is number of comments to get\n")
         sys.stderr.write("for each subreddit, then submissions and comments to get for each user.\n")
+        sys.stderr.write("-k keeps only the top_k subreddits and the heaviest pairs in fixed memory (streaming mode);\n")
+        sys.stderr.write("-p sets how many pairs are tracked (default: every pair of the top_k).\n")
+        sys.stderr.write("-w, -t and -c prune light edges, all but each node's heaviest edges, and the k-core before writing.\n")
+        sys.stderr.write("-f snap writes a memory-mappable .rsnap snapshot instead of .gexf (see snapshot.py).\n")
         sys.exit()
 
     sub1 = sys.argv[1]
@@ -58,6 +126,10 @@ def main():
     DEBUG = False
     VERBOSE = False
     LIMIT = None
+    TOP_K = None
+    PAIR_CAPACITY = None
+    OUTPUT_FORMAT = "gexf"
+    MIN_WEIGHT, TOP_NEIGHBORS, K_CORE = None, None, None
 
     if len(sys.argv) >= 4:
         for i, arg in enumerate(sys.argv[3:]):
@@ -66,7 +138,21 @@ def main():
             if arg == "-v":
                 VERBOSE = True
             if arg == "-l":
-                LIMIT = int(sys.argv[i+1+3]) # because looping through [3:]
+                limit_string = sys.argv[i+1+3] # because looping through [3:]
+                if limit_string != "None":
+                    LIMIT = int(limit_string)
+            if arg == "-k":
+                TOP_K = int(sys.argv[i+1+3])
+            if arg == "-p":
+                PAIR_CAPACITY = int(sys.argv[i+1+3])
+            if arg == "-w":
+                MIN_WEIGHT = int(sys.argv[i+1+3])
+            if arg == "-t":
+                TOP_NEIGHBORS = int(sys.argv[i+1+3])
+            if arg == "-c":
+                K_CORE = int(sys.argv[i+1+3])
+            if arg == "-f":
+                OUTPUT_FORMAT = sys.argv[i+1+3]
 
     ## SETUP PRAW ##
     user_agent = ("/u/sna_bot graph_two_subreddits algorithm "
@@ -79,33 +165,7 @@ def main():
     all_redditors += get_all_redditors_from_a_sub(r, sub2, LIMIT)
 
     # Get list of subreddits visited for each redditor
-    # Add nodes to graph for each subreddit, and add edges between
-    # subreddits when a single user users them
-    graph = networkx.Graph()
-    for redditor in all_redditors:
-        print("working on " + str(redditor))
-        subs_visited = get_subreddits_visited_for_redditor(redditor, LIMIT)
-        print("\tvisited: " + str(subs_visited))
-        for sub in subs_visited:
-            if sub not in graph.nodes():
-                graph.add_node(sub, users=1)
-            else:
-                graph.node[sub]['users'] += 1 # TODO verify this works
-        # TODO add edges
-        # ok if got 'pics', 'funny', 'gifs' need edges from pics to funny
-        # (create with weight=1 if not there, weight += 1 if already there)
-        # from pics to gifs and from funny to gifs
-        # how do i do it. [pics, funny, gifs]
-        # from [0] to [1:]
-        # from [1] to [2:]
-        # while i+1 < len(list)
-        for i in range(len(subs_visited)):
-            this_sub = subs_visited[i]
-            for target in subs_visited[i+1:]:
-                if target not in graph[this_sub]:
-                    graph.add_edge(this_sub, target, weight=1)
-                else:
-                    graph[this_sub][target]['weight'] += 1
+    graph = build_subreddit_graph(all_redditors, LIMIT, TOP_K, PAIR_CAPACITY)
 
     # Summarize results
     print("looked at a total of " + str(len(all_redditors)) + " redditors.")
@@ -117,13 +177,22 @@ def main():
             if data > 1:
                 print(n, nbr, data)
 
-    # Write .gexf file
+    # Prune before writing
+    graph, report = reduce_graph(graph, MIN_WEIGHT, TOP_NEIGHBORS, K_CORE,
+                                 VERBOSE=True)
+
+    # Write .gexf (or .rsnap) file
     timestamp = datetime.datetime.now().isoformat()
     filename = sub1 + "." + sub2 + "."
     filename += "linked_by_common_users."
     filename += "limit_" + str(LIMIT) + "."
-    filename += timestamp + ".gexf"
-    networkx.write_gexf(graph, filename)
+    if TOP_K is not None:
+        filename += "top_" + str(TOP_K) + "."
+    filename += timestamp
+    if OUTPUT_FORMAT == "snap":
+        write_snapshot(graph, filename + ".rsnap")
+    else:
+        networkx.write_gexf(graph, filename + ".gexf")
 
 
 
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import sys
+import csv
+import networkx as nx
+import xml.etree.ElementTree as ET
+from snapshot import load_snapshot, write_snapshot
+
+# columns of a Gephi edge table exported without a header row, e.g.
+# data/redditor-centric/trp.fem.out_group_sub_edges.tsv
+TSV_COLUMNS = ['Source', 'Target', 'Type', 'Id', 'Label', 'Weight',
+               'in_group_submissions', 'out_group_submissions']
+# per-file identifiers, not evidence to merge
+SKIP_KEYS = ('id', 'label', 'Id', 'Label', 'Type')
+GEXF_NUMERIC_TYPES = {'integer': int, 'long': int,
+                      'float': float, 'double': float}
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def merge_attrs(old, new, numeric="sum"):
+    """Merges attribute dict new into old, in place.
+    * Numbers are summed (or the larger kept if numeric is "max").
+    * Strings are treated as comma separated sets and unioned, the same
+      way same_submission.py keeps "user_of".
+    """
+    for key, value in new.items():
+        if key in SKIP_KEYS or value is None or value == '':
+            continue
+        if key not in old:
+            old[key] = value
+        elif isinstance(value, (int, float)) and \
+                isinstance(old[key], (int, float)):
+            if numeric == "max":
+                old[key] = max(old[key], value)
+            else:
+                old[key] += value
+        else:
+            seen = set(str(old[key]).split(','))
+            seen.update(str(value).split(','))
+            old[key] = ','.join(sorted(seen))
+
+def is_directed(filename):
+    """Peeks at an input just far enough to tell if its edges are directed."""
+    if filename.endswith(".rsnap"):
+        with load_snapshot(filename) as snapshot:
+            return snapshot.directed
+    if filename.endswith(".gexf"):
+        for event, elem in ET.iterparse(filename, events=('start',)):
+            if _local(elem.tag) == 'graph':
+                return elem.get('defaultedgetype') == 'directed'
+        return False
+    for source, target, attrs in iter_tsv(filename):
+        return attrs.get('Type', '').lower() == 'directed'
+    return False
+
+def iter_gexf(filename):
+    """Yields ('node', name, attrs) and ('edge', (u, v), attrs) from a GEXF.
+
+    The file is read with iterparse and each element is discarded once
+    handled, so only the id -> name map of this one file is held.
+    """
+    attr_titles = {'node': {}, 'edge': {}}
+    attr_types = {}
+    names = {}
+    attr_class = None
+    container = None
+    for event, elem in ET.iterparse(filename, events=('start', 'end')):
+        tag = _local(elem.tag)
+        if event == 'start':
+            if tag == 'attributes':
+                attr_class = elem.get('class')
+            elif tag in ('nodes', 'edges'):
+                container = elem
+            continue
+
+        if tag == 'attribute':
+            attr_titles[attr_class][elem.get('id')] = elem.get('title')
+            attr_types[(attr_class, elem.get('id'))] = \
+                    GEXF_NUMERIC_TYPES.get(elem.get('type'), str)
+        elif tag in ('node', 'edge'):
+            attrs = {}
+            for child in elem.iter():
+                if _local(child.tag) != 'attvalue':
+                    continue
+                key = child.get('for') or child.get('id')
+                convert = attr_types.get((tag, key), str)
+                try:
+                    value = convert(child.get('value'))
+                except ValueError:
+                    value = child.get('value')
+                attrs[attr_titles[tag].get(key, key)] = value
+            if tag == 'node':
+                name = elem.get('label') or elem.get('id')
+                names[elem.get('id')] = name
+                yield 'node', name, attrs
+            else:
+                if elem.get('weight') is not None:
+                    attrs['weight'] = float(elem.get('weight'))
+                source = names.get(elem.get('source'), elem.get('source'))
+                target = names.get(elem.get('target'), elem.get('target'))
+                yield 'edge', (source, target), attrs
+            elem.clear()
+            if container is not None:
+                container.clear()
+
+def iter_tsv(filename):
+    """Yields (source, target, attrs) rows from a Gephi edge table TSV."""
+    columns = TSV_COLUMNS
+    with open(filename, newline='') as f:
+        for i, row in enumerate(csv.reader(f, delimiter='\t')):
+            if i == 0 and row and row[0] == 'Source':
+                columns = row
+                continue
+            if len(row) != len(columns):
+                sys.stderr.write("iter_tsv: skipping line " + str(i + 1) +
+                        " of " + filename + "; expected " +
+                        str(len(columns)) + " columns\n")
+                continue
+            attrs = dict(zip(columns[2:], row[2:]))
+            if attrs.get('Weight'):
+                attrs['weight'] = float(attrs.pop('Weight'))
+            else:
+                attrs.pop('Weight', None)
+            yield row[0], row[1], attrs
+
+def iter_graph_file(filename):
+    """Yields ('node', name, attrs) and ('edge', (u, v), attrs) items."""
+    if filename.endswith(".gexf"):
+        for item in iter_gexf(filename):
+            yield item
+    elif filename.endswith(".rsnap"):
+        with load_snapshot(filename) as snapshot:
+            for name, attrs in snapshot.nodes(data=True):
+                yield 'node', name, attrs
+            for u, v, attrs in snapshot.edges(data=True):
+                yield 'edge', (u, v), attrs
+    else:
+        for source, target, attrs in iter_tsv(filename):
+            yield 'edge', (source, target), attrs
+
+def merge_graph_files(filenames, numeric="sum", VERBOSE=False):
+    """Streams run outputs into one union graph.
+    * Nodes are deduplicated by name; edges by their endpoints.
+    * Attributes are combined with merge_attrs.
+    * The result is directed only if every input is.
+
+    Arguments:
+        filenames: a list of .gexf, .rsnap or .tsv filenames
+        numeric: "sum" or "max", how to combine numeric attributes
+        VERBOSE: a boolean
+
+    Returns:
+        a NetworkX Graph (or DiGraph) object
+    """
+    if filenames and all(is_directed(f) for f in filenames):
+        graph = nx.DiGraph()
+    else:
+        graph = nx.Graph()
+
+    for filename in filenames:
+        if VERBOSE:
+            print("merging " + filename)
+        for kind, key, attrs in iter_graph_file(filename):
+            if kind == 'node':
+                if key not in graph:
+                    graph.add_node(key)
+                merge_attrs(graph.node[key], attrs, numeric)
+            else:
+                u, v = key
+                if not graph.has_edge(u, v):
+                    graph.add_edge(u, v)
+                merge_attrs(graph[u][v], attrs, numeric)
+        if VERBOSE:
+            print("\tunion graph now has " + str(graph.number_of_nodes()) +
+                  " nodes and " + str(graph.number_of_edges()) + " edges")
+    return graph
+
+def main():
+    if len(sys.argv) < 3:
+        sys.stderr.write("usage: merge_graphs.py <output.gexf|output.rsnap> "
+                         "<input> [<input> ...] [-m sum|max] [-v]\n")
+        sys.stderr.write("(inputs are .gexf, .rsnap or Gephi edge table .tsv "
+                         "files)\n")
+        sys.stderr.write("(-m max keeps the largest weight instead of the sum, "
+                         "e.g. for nested limit_10/limit_50 runs)\n")
+        sys.exit()
+
+    outfile = sys.argv[1]
+    numeric = "sum"
+    VERBOSE = False
+    infiles = []
+    args = iter(sys.argv[2:])
+    for arg in args:
+        if arg == "-m":
+            numeric = next(args)
+        elif arg == "-v":
+            VERBOSE = True
+        else:
+            infiles.append(arg)
+
+    graph = merge_graph_files(infiles, numeric, VERBOSE)
+    if outfile.endswith(".rsnap"):
+        write_snapshot(graph, outfile)
+    else:
+        nx.write_gexf(graph, outfile)
+
+############################################################################
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import heapq
+import networkx as nx
+
+def edge_weight(eattr):
+    """Return an edge's weight, or its number of shared submissions.
+
+    Subreddit graphs carry a numeric "weight"; user graphs from
+    same_submission.py instead carry comma separated sets of permalinks
+    in "in_group_submissions" and "out_group_submissions" (see
+    same_submission.add_submission_to_edge).
+    """
+    if 'weight' in eattr:
+        return eattr['weight']
+    submissions = set()
+    for key in ('in_group_submissions', 'out_group_submissions'):
+        if eattr.get(key):
+            submissions.update(eattr[key].split(','))
+    return len(submissions)
+
+def remove_light_edges(graph, min_weight):
+    """Remove edges whose edge_weight() is below min_weight."""
+    light = [(u, v) for u, v, eattr in graph.edges(data=True)
+             if edge_weight(eattr) < min_weight]
+    graph.remove_edges_from(light)
+    return graph
+
+def keep_top_k_neighbors(graph, k):
+    """Keep only edges among the k heaviest of at least one endpoint."""
+    keep = set()
+    for node in graph.nodes():
+        nbrs = graph[node]
+        if len(nbrs) <= k:
+            heaviest = nbrs
+        else:
+            heaviest = heapq.nlargest(k, nbrs,
+                    key=lambda nbr: edge_weight(nbrs[nbr]))
+        for nbr in heaviest:
+            keep.add((node, nbr))
+    drop = [(u, v) for u, v in graph.edges()
+            if (u, v) not in keep and (v, u) not in keep]
+    graph.remove_edges_from(drop)
+    return graph
+
+def reduce_graph(graph, min_weight=None, top_k=None, k_core=None,
+                 VERBOSE=False):
+    """Shrinks a graph before it is written out.
+    * Edges lighter than min_weight are removed first (see edge_weight).
+    * Then each node keeps only its top_k heaviest edges; an edge survives
+      if it is in the top_k of either endpoint.
+    * Nodes left with no edges by those two steps are dropped; nodes that
+      had none to begin with are kept.
+    * Finally self-loops are dropped and the k_core of what remains is
+      taken.
+    * Any step left as None is skipped.
+
+    Arguments:
+        graph: a NetworkX Graph object (modified in place)
+        min_weight: an integer, or None
+        top_k: an integer, or None
+        k_core: an integer, or None
+        VERBOSE: a boolean
+
+    Returns:
+        a (graph, report) tuple; report is a dict of node and edge counts
+        before and after each step
+
+    >>> g = nx.Graph([('a', 'a'), ('a', 'b'), ('b', 'c'), ('c', 'a'),
+    ...               ('c', 'd')])
+    >>> g, report = reduce_graph(g, k_core=2)
+    >>> sorted(g.nodes()), report['self_loops_removed']
+    (['a', 'b', 'c'], 1)
+    >>> g = nx.Graph()
+    >>> g.add_edge('a', 'b', weight=3)
+    >>> g.add_edge('b', 'c', weight=1)
+    >>> g, report = reduce_graph(g, min_weight=2)
+    >>> sorted(g.nodes()), report['isolates_removed']
+    (['a', 'b'], 1)
+    """
+    report = {'nodes_before': graph.number_of_nodes(),
+              'edges_before': graph.number_of_edges()}
+    already_isolated = set(nx.isolates(graph))
+    if min_weight is not None:
+        graph = remove_light_edges(graph, min_weight)
+        report['edges_after_min_weight'] = graph.number_of_edges()
+    if top_k is not None:
+        graph = keep_top_k_neighbors(graph, top_k)
+        report['edges_after_top_k'] = graph.number_of_edges()
+    if min_weight is not None or top_k is not None:
+        isolated = [n for n in nx.isolates(graph) if n not in already_isolated]
+        graph.remove_nodes_from(isolated)
+        report['isolates_removed'] = len(isolated)
+    if k_core is not None:
+        # k_core refuses graphs with self-loops, which older
+        # same_submission.py graphs have where a submission's author also
+        # commented on it
+        self_loops = list(graph.selfloop_edges())
+        graph.remove_edges_from(self_loops)
+        report['self_loops_removed'] = len(self_loops)
+        graph = nx.k_core(graph, k_core)
+    report['nodes_after'] = graph.number_of_nodes()
+    report['edges_after'] = graph.number_of_edges()
+
+    if VERBOSE:
+        print_reduction_report(report)
+    return graph, report
+
+def print_reduction_report(report):
+    print("reduced graph from " + str(report['nodes_before']) + " nodes and " +
+          str(report['edges_before']) + " edges to " +
+          str(report['nodes_after']) + " nodes and " +
+          str(report['edges_after']) + " edges.")
+    if 'isolates_removed' in report:
+        print("\t" + str(report['isolates_removed']) +
+              " nodes left without edges removed")
+    if 'self_loops_removed' in report:
+        print("\t" + str(report['self_loops_removed']) +
+              " self-loops removed before taking the k-core")
+    for step in ('min_weight', 'top_k'):
+        key = 'edges_after_' + step
+        if key in report:
+            print("\t" + str(report[key]) + " edges left after " + step)
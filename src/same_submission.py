@@ -6,15 +6,25 @@ import datetime
 import praw
 import collections
 import networkx as nx
+from reduce_graph import reduce_graph
+from snapshot import write_snapshot
 
 def parse_command_line_args():
     debug, verbose = False, False
+    min_weight, top_neighbors, k_core = None, None, None
+    output_format = "gexf"
     if len(sys.argv) < 3:
         sys.stderr.write("usage: same_sumission.py <subreddit1> <subreddit2>"+\
-                         "[-d] -[v] [-l limit]\n")
+                         "[-d] -[v] [-l limit] [-w min_weight] "+\
+                         "[-t top_neighbors] [-c k_core] [-f gexf|snap]\n")
         sys.stderr.write("(enter -d for debug mode, -v for verbose mode)\n")
         sys.stderr.write("(enter -l 10 for a submission fetch limit of 10)\n")
         sys.stderr.write("(enter -l None for as many as possible)\n")
+        sys.stderr.write("(enter -w 2 to drop edges with fewer than 2 shared "+\
+                         "submissions, -t 5 to keep each user's 5 strongest "+\
+                         "edges, -c 2 to keep only the 2-core)\n")
+        sys.stderr.write("(enter -f snap to write .rsnap snapshots "+\
+                         "instead of .gexf)\n")
         sys.exit()
 
     sub1 = sys.argv[1]
@@ -26,6 +36,14 @@ def parse_command_line_args():
                 debug = True
             elif "-v" in arg:
                 verbose = True
+            elif arg == "-w":
+                min_weight = int(sys.argv[i+4])
+            elif arg == "-t":
+                top_neighbors = int(sys.argv[i+4])
+            elif arg == "-c":
+                k_core = int(sys.argv[i+4])
+            elif arg == "-f":
+                output_format = sys.argv[i+4]
             elif "l" in arg:
                 limit_string = sys.argv[i+4] # b/c for loop starts at the 4th
                 if limit_string == "None":
@@ -33,27 +51,15 @@ def parse_command_line_args():
                 else:
                     limit = int(limit_string)
 
-    return sub1, sub2, debug, verbose, limit
+    return (sub1, sub2, debug, verbose, limit,
+            min_weight, top_neighbors, k_core, output_format)
 
 
 def print_graph_summary(graph):
-    for node in graph.nodes():
-        if ',' in graph.node[node]['user_of']:
-            print("\n\n\n**********\n\n\n*********")
-            print("user of more than one: " + graph.node[node]['user_of'])
-            print("\n\n\n**********\n\n\n*********")
-        print("node " + node + " has " + str(len(graph.neighbors(node)))+\
-              " neighbors")
-        print("they are:")
-        for neighbor in graph.neighbors(node):
-            print("\t" + neighbor + "\t" + graph.node[neighbor]['user_of'])
-    for node, neighbors in graph.adjacency_iter():
-        for neighbor, eattr in neighbors.items():
-            if 'out_group_submissions' in eattr:
-                print("Found an out_group_submission link between users " +
-                        node + " and " + neighbor + ".")
-                print("The link is from: " +\
-                      graph[node][neighbor]['out_group_submissions'])
+    """Prints the cross-group report from analytics.py as JSON."""
+    # imported here so numpy is only needed when a summary is asked for
+    from analytics import graph_report, write_report
+    write_report(graph_report(graph))
 
 def get_top_N_from_month(subreddit, N, r, DEBUG=False, VERBOSE=False):
     if DEBUG:
@@ -69,6 +75,19 @@ def get_top_N_from_month(subreddit, N, r, DEBUG=False, VERBOSE=False):
         # Return a generator object (has_fetched = False)
         return r.get_subreddit(subreddit).get_top_from_month(limit=N)
 
+def add_submission_to_edge(graph, user1, user2, key, permalink):
+    """Creates the edge if necessary and adds permalink to its key property.
+    * The property is kept as a sorted, comma separated set of permalinks
+      (like a node's "user_of"), so its length counts shared submissions.
+    """
+    if not graph.has_edge(user1, user2):
+        graph.add_edge(user1, user2)
+    eattr = graph[user1][user2]
+    seen_list = eattr[key].split(',') if eattr.get(key) else []
+    if permalink not in seen_list:
+        seen_list.append(permalink)
+        eattr[key] = ','.join(sorted(seen_list))
+
 def update_graph_with_comment(graph, submission, comment, 
            already_added, r, DEBUG=False, VERBOSE=False):
     """Creates/modifies nodes and edges based on an "in_group" comment.
@@ -113,24 +132,26 @@ def update_graph_with_comment(graph, submission, comment,
 
 
     # Add this subreddit to node's 'user_of' list if necessary
-    already_user_of = graph.node[this_author]['user_of']
-    if submission.subreddit.display_name not in already_user_of:
-        user_of_list = already_user_of.split(',')
+    user_of_list = graph.node[this_author]['user_of'].split(',')
+    if submission.subreddit.display_name not in user_of_list:
         user_of_list.append(submission.subreddit.display_name)
         user_of_list = sorted(user_of_list)
-        graph.node[this_author]['user_of'] = ','.join(seen_list)
+        graph.node[this_author]['user_of'] = ','.join(user_of_list)
 
     # connect this node to all others in the graph from this submission
     for author in already_added:
-        graph.add_edge(author, this_author, 
-                in_group_submissions=submission.permalink) 
+        if author == this_author:
+            continue
+        add_submission_to_edge(graph, author, this_author,
+                'in_group_submissions', submission.permalink)
 
     # modifies passed-in list, doesn't return, ick
     if this_author not in already_added:
         already_added.append(this_author)
 
 def update_graph_with_in_group_submission(graph, submission, r, 
-                                    DEBUG=False, VERBOSE=False):
+                                    DEBUG=False, VERBOSE=False,
+                                    reply_graph=None):
     """Creates/modifies nodes and edges based on an "in_group" submission.
     * Each node is tagged as "user of" subreddit.
     * Edges between users are created/modified when they appear in 
@@ -138,6 +159,8 @@ def update_graph_with_in_group_submission(graph, submission, r,
     * The submission's permalink is added to the "in_group_submissions" property
       of the edge.
     * Returns graph unmodified if submission.author is Deleted
+    * If reply_graph is given, directed reply edges from the same
+      flattened comment tree are added to it as well.
 
     Arguments:
         graph: a NetworkX Graph object
@@ -145,6 +168,7 @@ def update_graph_with_in_group_submission(graph, submission, r,
         r: a praw.Reddit object
         DEBUG: a boolean
         VERBOSE: a boolean
+        reply_graph: a NetworkX DiGraph object, or None
 
     Returns:
         the updated Graph object
@@ -175,8 +199,13 @@ def update_graph_with_in_group_submission(graph, submission, r,
     if VERBOSE:
         print("\t\tIt has " + str(len(flat_comments)) + " comments")
 
+    # Reply edges first, so nothing below can cost us this thread's replies
+    if reply_graph is not None:
+        update_reply_graph_with_comments(reply_graph, submission,
+                                         flat_comments, VERBOSE)
+
     # Add node for Submission author (if necessary)
-    if submission.author not in graph.nodes():
+    if submission.author.name not in graph.nodes():
         graph.add_node(submission.author.name, 
                 user_of=submission.subreddit.display_name) 
     
@@ -186,8 +215,65 @@ def update_graph_with_in_group_submission(graph, submission, r,
                 already_added, r, DEBUG, VERBOSE)
     return graph
 
+def update_reply_graph_with_comments(reply_graph, submission, flat_comments,
+                                     VERBOSE=False):
+    """Adds directed user-to-user reply edges from an already-fetched tree.
+    * Each comment is indexed by its fullname in a single pass, so a
+      reply's parent author is a dict lookup instead of a get_info call.
+    * An edge runs from the replying author to the author replied to.
+      Its "weight" counts replies and its "subreddit" property lists
+      (comma separated) where they took place.
+    * Replies to self, Deleted authors and MoreComments are skipped.
+
+    Arguments:
+        reply_graph: a NetworkX DiGraph object
+        submission: a praw.reddit.Submission object
+        flat_comments: a list of praw.Reddit.Comment objects, e.g. from
+                       praw.helpers.flatten_tree(submission.comments)
+        VERBOSE: a boolean
+
+    Returns:
+        the updated DiGraph object
+    """
+    subreddit = submission.subreddit.display_name
+
+    # index authors by fullname: t3_ for the submission, t1_ for comments
+    author_of = {}
+    if submission.author is not None:
+        author_of[submission.fullname] = submission.author.name
+    for comment in flat_comments:
+        if isinstance(comment, praw.objects.MoreComments):
+            continue
+        if comment.author is not None:
+            author_of[comment.fullname] = comment.author.name
+
+    for comment in flat_comments:
+        if isinstance(comment, praw.objects.MoreComments):
+            continue
+        if comment.author is None:
+            continue
+        replier = comment.author.name
+        replied_to = author_of.get(comment.parent_id)
+        if replied_to is None or replied_to == replier:
+            continue
+        if reply_graph.has_edge(replier, replied_to):
+            eattr = reply_graph[replier][replied_to]
+            eattr['weight'] += 1
+            seen_list = eattr['subreddit'].split(',')
+            if subreddit not in seen_list:
+                seen_list.append(subreddit)
+                eattr['subreddit'] = ','.join(sorted(seen_list))
+        else:
+            reply_graph.add_edge(replier, replied_to, weight=1,
+                                 subreddit=subreddit)
+        if VERBOSE:
+            print("\t\t\t" + replier + " replied to " + replied_to)
+
+    return reply_graph
+
 def update_graph_with_subreddit_of_interest(graph, N, sub, r, 
-                                    DEBUG=False, VERBOSE=False):
+                                    DEBUG=False, VERBOSE=False,
+                                    reply_graph=None):
     """Gets top N submissions from given subreddit, updates graph.
     * Each node is tagged as "user of" subreddit.
     * Edges between users are created/modified when they appear in the same submission.
@@ -199,6 +285,7 @@ def update_graph_with_subreddit_of_interest(graph, N, sub, r,
         N: an integer for how many top submissions from month to fetch
         sub: a string representingi the subreddit name
         r: a praw.Reddit object
+        reply_graph: a NetworkX DiGraph object for reply edges, or None
 
     Returns:
         the updated Graph object
@@ -215,7 +302,8 @@ def update_graph_with_subreddit_of_interest(graph, N, sub, r,
     for submission in top_submissions:
         try:
             graph = update_graph_with_in_group_submission(graph, submission, 
-                                                            r, DEBUG, VERBOSE)
+                                                            r, DEBUG, VERBOSE,
+                                                            reply_graph)
         except Exception as e: 
             sys.stderr.write("Error fetching top submissions for subreddit " +\
                              str(sub) + ".\n")
@@ -345,8 +433,8 @@ def update_graph_with_user_comments(graph, username, r, in_groups,
                         print("\n\t\t\t\t\tComment author is already"+\
                               " in the graph, but this is an out_group"+\
                               " submission! Jackpot!\n")
-                    graph.add_edge(username, comment_author, 
-                            out_group_submissions=submission.permalink) 
+                    add_submission_to_edge(graph, username, comment_author,
+                            'out_group_submissions', submission.permalink)
         except Exception as e:
             sys.stderr.write("\nException occurred in "+\
                              " update_graph_with_user_comments(): ")
@@ -356,8 +444,17 @@ def update_graph_with_user_comments(graph, username, r, in_groups,
 
     return graph
 
+def write_graph(graph, filename, output_format="gexf"):
+    """Writes graph to filename plus a .gexf or .rsnap extension."""
+    if output_format == "snap":
+        write_snapshot(graph, filename + ".rsnap")
+    else:
+        nx.write_gexf(graph, filename + ".gexf")
+
 def main():
-    sub1, sub2, DEBUG, VERBOSE, LIMIT = parse_command_line_args()
+    (sub1, sub2, DEBUG, VERBOSE, LIMIT,
+            MIN_WEIGHT, TOP_NEIGHBORS, K_CORE,
+            OUTPUT_FORMAT) = parse_command_line_args()
 
     if DEBUG:
         sub1, sub2 = '100pushups', 'MakeupAddiction'
@@ -367,6 +464,7 @@ def main():
     r = praw.Reddit(user_agent=user_agent)
 
     graph = nx.Graph()
+    reply_graph = nx.DiGraph()
 
     submissions_per_subreddit = LIMIT
 
@@ -375,7 +473,7 @@ def main():
         print("\nAdding nodes and in_group_submissions edges for first "+\
                 " subreddit, " + sub1)
     graph = update_graph_with_subreddit_of_interest(graph, 
-            submissions_per_subreddit, sub1, r, DEBUG, VERBOSE)
+            submissions_per_subreddit, sub1, r, DEBUG, VERBOSE, reply_graph)
 
     # Add nodes and edges for users of second subreddit
     #   If the two subreddits have any  users in common,
@@ -385,7 +483,7 @@ def main():
         print("Adding nodes and in_group_submissions edges for second "+\
                 "subreddit, " + sub2)
     graph = update_graph_with_subreddit_of_interest(graph,
-            submissions_per_subreddit, sub2, r, DEBUG, VERBOSE)
+            submissions_per_subreddit, sub2, r, DEBUG, VERBOSE, reply_graph)
 
     # For each user in the graph, explore previous comments
     #   made outside of the user's "user_of" subreddit(s).
@@ -404,20 +502,31 @@ def main():
             if count % 100 == 0:
                 print("\n\t\tNow processing user " + str(count) + "\n")
 
+    # Prune light edges and peripheral users before writing
+    graph, report = reduce_graph(graph, MIN_WEIGHT, TOP_NEIGHBORS, K_CORE,
+                                 VERBOSE)
+
     # Summarize graph
     if VERBOSE:
         print_graph_summary(graph)
-        print("writing gexf...")
+        print("writing " + OUTPUT_FORMAT + "...")
 
-    # Write .gexf file
+    # Write .gexf (or .rsnap) file
     timestamp = datetime.datetime.now().isoformat()
     filename = sub1 + "." + sub2 + "."
     filename += "limit_" + str(LIMIT) + "."
-    filename += timestamp + ".gexf"
-    nx.write_gexf(graph, filename)
+    filename += timestamp
+    write_graph(graph, filename, OUTPUT_FORMAT)
+
+    # Write directed reply graph built from the same comment trees
+    filename = sub1 + "." + sub2 + "."
+    filename += "replies."
+    filename += "limit_" + str(LIMIT) + "."
+    filename += timestamp
+    write_graph(reply_graph, filename, OUTPUT_FORMAT)
 
     if VERBOSE:
-        print("wrote gexf...")
+        print("wrote " + OUTPUT_FORMAT + "...")
 
 ############################################################################
 
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+import sys
+import math
+import heapq
+import random
+import networkx
+
+class CountMinSketch(object):
+    """Approximate counts for a stream in fixed memory.
+
+    For an item with true count c after N updates, estimate() returns c_hat
+    with c <= c_hat, and c_hat <= c + epsilon * N with probability at least
+    1 - delta, where width = ceil(e / epsilon) and depth = ceil(ln(1 / delta)).
+    """
+
+    def __init__(self, width, depth, seed=None):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        rng = random.Random(seed)
+        self.salts = [rng.getrandbits(64) for _ in range(depth)]
+        self.rows = [[0] * width for _ in range(depth)]
+
+    @classmethod
+    def from_error_bounds(cls, epsilon, delta, seed=None):
+        width = int(math.ceil(math.e / epsilon))
+        depth = int(math.ceil(math.log(1.0 / delta)))
+        return cls(width, depth, seed)
+
+    def _cells(self, item):
+        for row, salt in zip(self.rows, self.salts):
+            yield row, hash((salt, item)) % self.width
+
+    def add(self, item, count=1):
+        self.total += count
+        for row, i in self._cells(item):
+            row[i] += count
+
+    def estimate(self, item):
+        return min(row[i] for row, i in self._cells(item))
+
+
+class SpaceSaving(object):
+    """Top-k heavy hitters of a stream, holding at most `capacity` counters.
+
+    Each monitored item has a count and an error with
+    count - error <= true count <= count. Any item whose true count is
+    greater than N / capacity is guaranteed to be monitored.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        # min-heap of (count, item); entries go stale when a count changes
+        # and are skipped on eviction
+        self.heap = []
+
+    def add(self, item, count=1):
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            min_count, min_item = self._pop_min()
+            del self.counts[min_item]
+            del self.errors[min_item]
+            self.counts[item] = min_count + count
+            self.errors[item] = min_count
+        heapq.heappush(self.heap, (self.counts[item], item))
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(c, i) for i, c in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self.heap)
+            if self.counts.get(item) == count:
+                return count, item
+
+    def items(self):
+        """Return (item, count, error) tuples, largest count first."""
+        return sorted(((i, c, self.errors[i]) for i, c in self.counts.items()),
+                      key=lambda x: x[1], reverse=True)
+
+
+class CoVisitationSketch(object):
+    """Streaming replacement for the subreddit co-visitation graph.
+
+    Subreddit counts are tracked by a SpaceSaving summary of `top_k`
+    counters and subreddit pairs by a separate one of `pair_capacity`
+    counters, since the pair stream grows quadratically with the number of
+    subreddits each redditor visits. Each is refined with a CountMinSketch,
+    so memory stays fixed no matter how many redditors are crawled.
+    """
+
+    def __init__(self, top_k, pair_capacity=None, delta=0.01, seed=None):
+        if pair_capacity is None:
+            # room for every pair among the top_k subreddits
+            pair_capacity = max(top_k * (top_k - 1) // 2, 1)
+        self.node_counts = SpaceSaving(top_k)
+        self.edge_counts = SpaceSaving(pair_capacity)
+        self.node_sketch = CountMinSketch.from_error_bounds(
+                1.0 / top_k, delta, seed)
+        self.edge_sketch = CountMinSketch.from_error_bounds(
+                1.0 / pair_capacity, delta, seed)
+
+    def add_subs_visited(self, subs_visited):
+        """Count each subreddit once and each pair of subreddits once."""
+        for sub in subs_visited:
+            self.node_counts.add(sub)
+            self.node_sketch.add(sub)
+        for i in range(len(subs_visited)):
+            for target in subs_visited[i+1:]:
+                pair = tuple(sorted((subs_visited[i], target)))
+                self.edge_counts.add(pair)
+                self.edge_sketch.add(pair)
+
+    def to_graph(self, min_weight=2):
+        """Materialize a Graph of edges whose true weight is >= min_weight.
+
+        Only edges whose guaranteed lower bound (count - error) reaches
+        min_weight are kept, and that lower bound is written as "weight",
+        so no weight is ever overstated. "weight_upper" holds the smaller
+        of the two upper bounds; the true weight lies between the two.
+        Nodes get "users" and "users_upper" the same way.
+        """
+        graph = networkx.Graph()
+        for pair, count, error in self.edge_counts.items():
+            weight = count - error
+            if weight < min_weight:
+                continue
+            for sub in pair:
+                if sub not in graph:
+                    upper = self.node_sketch.estimate(sub)
+                    users = 0
+                    if sub in self.node_counts.counts:
+                        node_count = self.node_counts.counts[sub]
+                        upper = min(upper, node_count)
+                        users = node_count - self.node_counts.errors[sub]
+                    graph.add_node(sub, users=users, users_upper=upper)
+            graph.add_edge(pair[0], pair[1], weight=weight,
+                           weight_upper=min(count,
+                                            self.edge_sketch.estimate(pair)))
+            # a subreddit has at least as many users as any of its pairs
+            for sub in pair:
+                graph.node[sub]['users'] = max(graph.node[sub]['users'],
+                                               weight)
+        return graph
+
+    def print_bounds(self):
+        sys.stderr.write("sketch: " + str(self.edge_counts.total) +
+                " pair updates, written edge weights underestimated by at "
+                "most " +
+                str(self.edge_counts.total // self.edge_counts.capacity) +
+                " and weight_upper overestimated by at most the same "
+                "(Space-Saving) or " +
+                str(int(self.edge_counts.total / self.edge_sketch.width *
+                        math.e)) +
+                " (Count-Min, p >= " +
+                str(1 - math.exp(-self.edge_sketch.depth)) + ")\n")
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""Binary graph snapshots that open through mmap without parsing.
+
+Layout (little endian, every section 8-byte aligned):
+
+    header      magic, version, directed, number of columns, counts
+                and the offset of each fixed section
+    columns     one descriptor per attribute column: name string id,
+                node/edge, type code ('q' int64, 'd' float64, 'I' string
+                id) and offset
+    strings     uint64 offsets into a utf-8 blob; node names, column
+                names and string attribute values are all interned here
+    node_names  uint32 string id per node, nodes sorted by name
+    indptr      uint64 CSR row pointers (n_nodes + 1)
+    indices     uint32 neighbor node index per entry, sorted in each row
+    attributes  one array per column, n_nodes or n_entries long
+
+Undirected edges are stored in both rows, directed edges only in the
+row of their source.
+"""
+
+import sys
+import mmap
+import array
+import bisect
+import struct
+import networkx as nx
+
+MAGIC = b'RSNA'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQQQQQQQQQ')
+COLUMN = struct.Struct('<IBBxxQ')
+NODE, EDGE = 0, 1
+MISSING_STRING = 0xFFFFFFFF
+MISSING_INT = -2**63
+
+def _align(n):
+    return (n + 7) & ~7
+
+def _column_type(values):
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, int) and not isinstance(v, bool)
+                       for v in present):
+        return 'q'
+    if present and all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                       for v in present):
+        return 'd'
+    return 'I'
+
+def _column_array(values, kind, intern):
+    if kind == 'q':
+        return array.array('q', (MISSING_INT if v is None else v
+                                 for v in values))
+    if kind == 'd':
+        return array.array('d', (float('nan') if v is None else v
+                                 for v in values))
+    return array.array('I', (MISSING_STRING if v is None else intern(str(v))
+                             for v in values))
+
+def write_snapshot(graph, filename):
+    """Writes a NetworkX graph to filename as a binary snapshot.
+
+    Arguments:
+        graph: a NetworkX Graph or DiGraph object
+        filename: a string
+
+    Returns:
+        None
+    """
+    strings = []
+    string_ids = {}
+    def intern(s):
+        if s not in string_ids:
+            string_ids[s] = len(strings)
+            strings.append(s)
+        return string_ids[s]
+
+    nodes = sorted(graph.nodes(), key=str)
+    node_index = dict((node, i) for i, node in enumerate(nodes))
+    node_names = array.array('I', (intern(str(node)) for node in nodes))
+
+    indptr = array.array('Q', [0])
+    indices = array.array('I')
+    entries = []  # edge attribute dicts, in CSR order
+    for node in nodes:
+        nbrs = sorted(graph[node], key=node_index.get)
+        for nbr in nbrs:
+            indices.append(node_index[nbr])
+            entries.append(graph[node][nbr])
+        indptr.append(len(indices))
+
+    node_attrs = [graph.node[node] for node in nodes]
+    columns = []
+    for target, attrs in ((NODE, node_attrs), (EDGE, entries)):
+        keys = sorted(set(key for attr in attrs for key in attr))
+        for key in keys:
+            values = [attr.get(key) for attr in attrs]
+            kind = _column_type(values)
+            columns.append((intern(key), target, kind,
+                            _column_array(values, kind, intern)))
+
+    blob = bytearray()
+    string_index = array.array('Q', [0])
+    for s in strings:
+        blob += s.encode('utf-8')
+        string_index.append(len(blob))
+
+    sections = [string_index, bytes(blob), node_names, indptr, indices]
+    sections += [column[3] for column in columns]
+    for section in sections:
+        if isinstance(section, array.array) and sys.byteorder == 'big':
+            section.byteswap()
+
+    offset = _align(HEADER.size + COLUMN.size * len(columns))
+    offsets = []
+    for section in sections:
+        offsets.append(offset)
+        offset = _align(offset + len(section) * getattr(section, 'itemsize', 1))
+
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, int(graph.is_directed()),
+                            len(columns), len(nodes), len(indices),
+                            graph.number_of_edges(), len(strings),
+                            *offsets[:5]))
+        for (name, target, kind, _), column_offset in zip(columns,
+                                                          offsets[5:]):
+            f.write(COLUMN.pack(name, target, ord(kind), column_offset))
+        for section, section_offset in zip(sections, offsets):
+            f.write(b'\0' * (section_offset - f.tell()))
+            f.write(section if isinstance(section, bytes)
+                    else section.tobytes())
+
+class Snapshot(object):
+    """A read-only graph backed by a memory-mapped snapshot file.
+
+    Opening only reads the header; arrays are memoryviews into the map,
+    so lookups touch just the pages they need.
+    """
+
+    def __init__(self, filename):
+        if sys.byteorder == 'big':
+            raise ValueError("snapshots can only be mapped on "
+                             "little endian hosts")
+        self._file = open(filename, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        (magic, version, directed, n_columns, self.n_nodes, self.n_entries,
+         self.n_edges, self.n_strings, string_index, blob, node_names,
+         indptr, indices) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(filename + " is not a version " +
+                             str(VERSION) + " graph snapshot")
+        self.directed = bool(directed)
+        self._string_index = self._array(string_index, 'Q', self.n_strings + 1)
+        self._blob = self._view[blob:blob + self._string_index[-1]]
+        self._node_names = self._array(node_names, 'I', self.n_nodes)
+        self._indptr = self._array(indptr, 'Q', self.n_nodes + 1)
+        self._indices = self._array(indices, 'I', self.n_entries)
+
+        self.node_columns, self.edge_columns = {}, {}
+        for i in range(n_columns):
+            name, target, kind, offset = COLUMN.unpack_from(
+                    self._map, HEADER.size + i * COLUMN.size)
+            kind = chr(kind)
+            if target == NODE:
+                self.node_columns[self.string(name)] = (
+                        kind, self._array(offset, kind, self.n_nodes))
+            else:
+                self.edge_columns[self.string(name)] = (
+                        kind, self._array(offset, kind, self.n_entries))
+
+    def _array(self, offset, kind, length):
+        size = struct.calcsize(kind)
+        return self._view[offset:offset + length * size].cast(kind)
+
+    def close(self):
+        for view in (self._string_index, self._blob, self._node_names,
+                     self._indptr, self._indices):
+            view.release()
+        for columns in (self.node_columns, self.edge_columns):
+            for kind, view in columns.values():
+                view.release()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def string(self, i):
+        return bytes(self._blob[self._string_index[i]:
+                                self._string_index[i + 1]]).decode('utf-8')
+
+    def node_name(self, i):
+        return self.string(self._node_names[i])
+
+    def node_index(self, name):
+        """Binary search the sorted node names; raises KeyError if absent."""
+        i = bisect.bisect_left(_NodeNames(self), name)
+        if i == self.n_nodes or self.node_name(i) != name:
+            raise KeyError(name)
+        return i
+
+    def nodes(self, data=False):
+        """Yields node names, or (name, attr dict) pairs if data is True."""
+        for i in range(self.n_nodes):
+            if not data:
+                yield self.node_name(i)
+                continue
+            yield self.node_name(i), self._node_attrs(i)
+
+    def __contains__(self, name):
+        try:
+            self.node_index(name)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return self.n_nodes
+
+    def _row(self, name):
+        i = self.node_index(name)
+        return self._indptr[i], self._indptr[i + 1]
+
+    def degree(self, name):
+        start, end = self._row(name)
+        return end - start
+
+    def neighbors(self, name):
+        start, end = self._row(name)
+        return [self.node_name(j) for j in self._indices[start:end]]
+
+    def _entry(self, u, v):
+        start, end = self._row(u)
+        j = self.node_index(v)
+        k = bisect.bisect_left(self._indices[start:end], j) + start
+        if k == end or self._indices[k] != j:
+            raise KeyError((u, v))
+        return k
+
+    def has_edge(self, u, v):
+        try:
+            self._entry(u, v)
+        except KeyError:
+            return False
+        return True
+
+    def _value(self, kind, column, i):
+        value = column[i]
+        if kind == 'I':
+            return None if value == MISSING_STRING else self.string(value)
+        if kind == 'q':
+            return None if value == MISSING_INT else value
+        return None if value != value else value
+
+    def node_attr(self, name, key):
+        kind, column = self.node_columns[key]
+        return self._value(kind, column, self.node_index(name))
+
+    def edge_attr(self, u, v, key):
+        kind, column = self.edge_columns[key]
+        return self._value(kind, column, self._entry(u, v))
+
+    def edges(self, data=False):
+        """Yields (u, v) or (u, v, attr dict) for every stored edge."""
+        for i in range(self.n_nodes):
+            u = None
+            for k in range(self._indptr[i], self._indptr[i + 1]):
+                j = self._indices[k]
+                if not self.directed and j < i:
+                    continue
+                if u is None:
+                    u = self.node_name(i)
+                if not data:
+                    yield u, self.node_name(j)
+                    continue
+                attr = {}
+                for key, (kind, column) in self.edge_columns.items():
+                    value = self._value(kind, column, k)
+                    if value is not None:
+                        attr[key] = value
+                yield u, self.node_name(j), attr
+
+    def _node_attrs(self, i):
+        attr = {}
+        for key, (kind, column) in self.node_columns.items():
+            value = self._value(kind, column, i)
+            if value is not None:
+                attr[key] = value
+        return attr
+
+    def to_networkx(self):
+        graph = nx.DiGraph() if self.directed else nx.Graph()
+        for name, attr in self.nodes(data=True):
+            graph.add_node(name, **attr)
+        for u, v, attr in self.edges(data=True):
+            graph.add_edge(u, v, **attr)
+        return graph
+
+class _NodeNames(object):
+    """Lazy sorted sequence of node names, for bisect."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return self.snapshot.n_nodes
+
+    def __getitem__(self, i):
+        return self.snapshot.node_name(i)
+
+def load_snapshot(filename):
+    return Snapshot(filename)
+
+def gexf_to_snapshot(gexf_filename, snapshot_filename):
+    write_snapshot(nx.read_gexf(gexf_filename), snapshot_filename)
+
+def snapshot_to_gexf(snapshot_filename, gexf_filename):
+    with load_snapshot(snapshot_filename) as snapshot:
+        nx.write_gexf(snapshot.to_networkx(), gexf_filename)
+
+def main():
+    if len(sys.argv) != 3:
+        sys.stderr.write("usage: snapshot.py <input.gexf> <output.rsnap>\n")
+        sys.stderr.write("   or: snapshot.py <input.rsnap> <output.gexf>\n")
+        sys.exit()
+
+    infile, outfile = sys.argv[1], sys.argv[2]
+    if infile.endswith(".gexf"):
+        gexf_to_snapshot(infile, outfile)
+    else:
+        snapshot_to_gexf(infile, outfile)
+
+############################################################################
+
+if __name__ == '__main__':
+    main()